@@ -0,0 +1,166 @@
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# -------------------------
+# Constants
+# -------------------------
+EMBED_MODEL = "all-MiniLM-L6-v2"
+EMBED_HF_REPO = f"sentence-transformers/{EMBED_MODEL}"
+DIMENSION = 384
+
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")  # "torch" or "onnx"
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))  # 0 lets the runtime decide
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_QUERY_CACHE_SIZE = int(os.getenv("EMBED_QUERY_CACHE_SIZE", "1024"))
+# int8 exports shipped in the model repo: model_quint8_avx2.onnx, model_qint8_avx512_vnni.onnx, model_qint8_arm64.onnx
+EMBED_ONNX_FILE = os.getenv("EMBED_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+EMBED_MAX_LENGTH = 256  # max_seq_length of all-MiniLM-L6-v2
+
+
+# -------------------------
+# Backends
+# -------------------------
+class TorchEmbeddings(Embeddings):
+    """The original sentence-transformers (PyTorch) path."""
+
+    def __init__(self, threads: int = EMBED_THREADS, batch_size: int = EMBED_BATCH_SIZE):
+        from langchain.embeddings import HuggingFaceEmbeddings
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self._embeddings = HuggingFaceEmbeddings(
+            model_name=EMBED_MODEL,
+            encode_kwargs={"batch_size": batch_size},
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embeddings.embed_query(text)
+
+
+class OnnxEmbeddings(Embeddings):
+    """all-MiniLM-L6-v2 as an int8 quantized ONNX model on ONNX Runtime (CPU).
+
+    Reproduces the sentence-transformers pipeline: mean pooling over the
+    attention mask followed by L2 normalization.
+    """
+
+    def __init__(self, onnx_file: str = EMBED_ONNX_FILE, threads: int = EMBED_THREADS,
+                 batch_size: int = EMBED_BATCH_SIZE):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        self.batch_size = batch_size
+        self._tokenizer = Tokenizer.from_file(hf_hub_download(EMBED_HF_REPO, "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=EMBED_MAX_LENGTH)
+        self._tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self._session = ort.InferenceSession(
+            hf_hub_download(EMBED_HF_REPO, onnx_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._input_names = {i.name for i in self._session.get_inputs()}
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self._session.run(None, inputs)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed(texts[i:i + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+# -------------------------
+# Query cache
+# -------------------------
+class CachedQueryEmbeddings(Embeddings):
+    """Wraps a backend with an LRU cache for query embeddings. Documents pass through.
+
+    A max_size of 0 disables caching but keeps the batched embed_queries.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_size: int = EMBED_QUERY_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def _lookup(self, text: str) -> List[float] | None:
+        with self._lock:
+            if text in self._cache:
+                self._cache.move_to_end(text)
+                return self._cache[text]
+        return None
+
+    def _store(self, text: str, vector: List[float]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._cache[text] = vector
+            if len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._lookup(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._store(text, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # Several queries at once: cache misses are embedded in a single batch
+        vectors = [self._lookup(t) for t in texts]
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            fresh = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            for text, vector in fresh.items():
+                self._store(text, vector)
+            vectors = [fresh[t] if v is None else v for t, v in zip(texts, vectors)]
+        return vectors
+
+
+BACKENDS = {
+    "torch": TorchEmbeddings,
+    "onnx": OnnxEmbeddings,
+}
+
+def create_embeddings(backend: str = EMBED_BACKEND) -> Embeddings:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBED_BACKEND '{backend}', expected one of: {', '.join(BACKENDS)}")
+    return CachedQueryEmbeddings(BACKENDS[backend]())
+
+@lru_cache(maxsize=None)
+def get_embeddings() -> Embeddings:
+    # Model loading is expensive, so the configured backend is shared process-wide
+    return create_embeddings()
@@ -0,0 +1,110 @@
+import time
+import random
+import argparse
+from typing import List, Dict, Any
+import numpy as np
+import faiss
+from .rag import chunk_file, collect_directory
+from .embeddings import BACKENDS, DIMENSION
+
+# -------------------------
+# Embedding backend benchmark
+#
+# Usage:
+#   python -m app.embeddings_benchmark path/to/corpus --backends torch onnx --threads 4
+#
+# Reports load time, document throughput and query latency per backend, and how
+# closely each backend's retrieval matches the first one (the reference).
+# -------------------------
+def load_corpus(path: str, limit: int) -> List[str]:
+    chunks = []
+    for entry in collect_directory(path, "benchmark"):
+        with open(entry["path"], "rb") as f:
+            chunks.extend(c for c in chunk_file(f, entry["name"]) if c.strip())
+        if len(chunks) >= limit:
+            break
+    return chunks[:limit]
+
+def sample_queries(chunks: List[str], amount: int, seed: int = 0) -> List[str]:
+    # Use a short random span of a chunk as query, so every query has a known relevant chunk
+    rng = random.Random(seed)
+    queries = []
+    for chunk in rng.sample(chunks, min(amount, len(chunks))):
+        words = chunk.split()
+        start = rng.randrange(max(1, len(words) - 12))
+        queries.append(" ".join(words[start:start + 12]))
+    return queries
+
+def run_backend(name: str, chunks: List[str], queries: List[str], threads: int, batch_size: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    embeddings = BACKENDS[name](threads=threads, batch_size=batch_size)
+    load_seconds = time.perf_counter() - start
+
+    embeddings.embed_documents(chunks[:batch_size])  # warm-up
+    start = time.perf_counter()
+    doc_vectors = np.array(embeddings.embed_documents(chunks), dtype=np.float32)
+    doc_seconds = time.perf_counter() - start
+
+    latencies = []
+    query_vectors = []
+    for q in queries:
+        start = time.perf_counter()
+        query_vectors.append(embeddings.embed_query(q))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    return {
+        "load_seconds": load_seconds,
+        "docs_per_second": len(chunks) / doc_seconds if doc_seconds else 0.0,
+        "query_ms_p50": 1000 * latencies[len(latencies) // 2],
+        "query_ms_p95": 1000 * latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+        "doc_vectors": doc_vectors,
+        "query_vectors": np.array(query_vectors, dtype=np.float32),
+    }
+
+def search(doc_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    index = faiss.IndexFlatIP(DIMENSION)
+    index.add(doc_vectors)
+    _, ids = index.search(query_vectors, k)
+    return ids
+
+def agreement(reference: Dict[str, Any], other: Dict[str, Any], k: int) -> Dict[str, float]:
+    ref_ids = search(reference["doc_vectors"], reference["query_vectors"], k)
+    other_ids = search(other["doc_vectors"], other["query_vectors"], k)
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_ids, other_ids)])
+    top1 = np.mean(ref_ids[:, 0] == other_ids[:, 0])
+    cosine = np.mean(np.sum(reference["doc_vectors"] * other["doc_vectors"], axis=1))
+    return {"overlap_at_k": float(overlap), "top1_match": float(top1), "mean_doc_cosine": float(cosine)}
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Compare embedding backends on a document corpus.")
+    parser.add_argument("corpus", help="Directory with documents (same formats as uploads)")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS),
+                        help="Backends to compare, the first one is the reference")
+    parser.add_argument("--threads", type=int, default=0, help="Thread count per backend (0 = runtime default)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    chunks = load_corpus(args.corpus, args.max_chunks)
+    if not chunks:
+        parser.error("no readable documents found in corpus")
+    queries = sample_queries(chunks, args.queries)
+    k = min(args.k, len(chunks))
+    print(f"Corpus: {len(chunks)} chunks, {len(queries)} queries, k={k}, threads={args.threads or 'default'}")
+
+    results = {name: run_backend(name, chunks, queries, args.threads, args.batch_size) for name in args.backends}
+    reference = args.backends[0]
+
+    print(f"\n{'backend':<8} {'load s':>8} {'docs/s':>9} {'q p50 ms':>9} {'q p95 ms':>9} "
+          f"{'overlap@k':>10} {'top1':>6} {'cosine':>7}")
+    for name, r in results.items():
+        agree = agreement(results[reference], r, k)
+        print(f"{name:<8} {r['load_seconds']:>8.2f} {r['docs_per_second']:>9.1f} {r['query_ms_p50']:>9.2f} "
+              f"{r['query_ms_p95']:>9.2f} {agree['overlap_at_k']:>10.3f} {agree['top1_match']:>6.3f} "
+              f"{agree['mean_doc_cosine']:>7.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import argparse
+from multiprocessing import Pool
+from typing import List, Dict, Any, Iterable
+from langchain_core.documents import Document
+from .rag import chunk_file, collect_directory, file_id_for
+from .embeddings import get_embeddings
+from .services import load_user_vectorstore, save_user_vectorstore, user_index_lock, ingest_checkpoint_path
+
+# -------------------------
+# Bulk ingestion CLI
+#
+# Usage:
+#   python -m app.ingest --user-id <id> path/to/folder
+#   python -m app.ingest --user-id <id> --manifest manifest.json
+# -------------------------
+
+# -------------------------
+# Collecting files
+# -------------------------
+def collect_manifest(manifest_path: str, user_id: str) -> List[Dict[str, Any]]:
+    # Manifest is a JSON list using the same fields as the /files/upload metadata,
+    # plus the "path" of the file on disk: [{"path", "name"?, "folderPath"?, "id"?}, ...]
+    with open(manifest_path) as f:
+        items = json.load(f)
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    for item in items:
+        path = item["path"]
+        if not os.path.isabs(path):
+            path = os.path.join(base, path)
+        name = item.get("name") or os.path.basename(path)
+        folder_path = item.get("folderPath", "")
+        entries.append({
+            "path": path,
+            "name": name,
+            "folderPath": folder_path,
+            "id": item.get("id") or file_id_for(user_id, folder_path, name),
+        })
+    return entries
+
+# -------------------------
+# Checkpoints
+# -------------------------
+def load_checkpoint(path: str) -> set:
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set(json.load(f).get("done", []))
+
+def save_checkpoint(path: str, done: set):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"done": sorted(done)}, f)
+    os.replace(tmp_path, path)
+
+# -------------------------
+# Chunking (runs in worker processes)
+# -------------------------
+def _chunk_entry(entry: Dict[str, Any]) -> tuple[Dict[str, Any], List[str] | None]:
+    # None marks a file that could not be read, so it is retried on the next run
+    try:
+        with open(entry["path"], "rb") as f:
+            return entry, chunk_file(f, entry["name"])
+    except Exception as e:
+        print(f"Error reading {entry['path']}: {e}", file=sys.stderr)
+        return entry, None
+
+def _chunk_all(entries: List[Dict[str, Any]], workers: int) -> Iterable[tuple[Dict[str, Any], List[str] | None]]:
+    if workers <= 1:
+        for entry in entries:
+            yield _chunk_entry(entry)
+        return
+    with Pool(processes=workers) as pool:
+        yield from pool.imap_unordered(_chunk_entry, entries)
+
+# -------------------------
+# Ingestion
+# -------------------------
+def ingest(user_id: str, entries: List[Dict[str, Any]], workers: int = 1, batch_size: int = 256,
+           checkpoint_path: str | None = None) -> int:
+    checkpoint_path = checkpoint_path or ingest_checkpoint_path(user_id)
+    done = load_checkpoint(checkpoint_path)
+    if done:
+        # Only trust checkpointed files that are still in the index, so a checkpoint
+        # (default or --checkpoint) survives /files/clear_rag without skipping files
+        with user_index_lock(user_id):
+            vectorstore = load_user_vectorstore(user_id)
+            indexed = {doc.metadata.get("id") for doc in vectorstore.docstore._dict.values()}
+        stale = len(done - indexed)
+        done &= indexed
+        if stale:
+            print(f"Ignoring {stale} checkpointed file(s) that are no longer in the index")
+    # A file listed twice would produce duplicate chunk ids, keep its first entry
+    seen = set()
+    unique = [e for e in entries if not (e["id"] in seen or seen.add(e["id"]))]
+    pending = [e for e in unique if e["id"] not in done]
+    skipped = len(unique) - len(pending)
+    if skipped:
+        print(f"Resuming: skipping {skipped} already ingested file(s)")
+    if not pending:
+        print("Nothing to ingest.")
+        return 0
+
+    embeddings = get_embeddings()
+    batch_docs: List[Document] = []
+    batch_chunk_ids: List[str] = []
+    batch_ids: List[str] = []
+    files_done = 0
+    files_failed = 0
+    chunks_added = 0
+    start = time.time()
+
+    # Embed a full batch at once, then under the index lock reload the store (the API
+    # may have changed it meanwhile), replace any chunks the batch's files already have,
+    # persist it and mark the files as done. Chunk ids are deterministic ("<file id>:<n>")
+    # and existing chunks of a file are replaced, so --restart or a crash between the
+    # save and the checkpoint re-embeds those files without storing them twice.
+    def _flush():
+        nonlocal chunks_added, done
+        texts = [d.page_content for d in batch_docs]
+        vectors = embeddings.embed_documents(texts) if texts else []
+        with user_index_lock(user_id):
+            vectorstore = load_user_vectorstore(user_id)
+            files = set(batch_ids)
+            existing = [doc_id for doc_id, doc in vectorstore.docstore._dict.items()
+                        if doc.metadata.get("id") in files]
+            if existing:
+                vectorstore.delete(existing)
+            if texts:
+                vectorstore.add_embeddings(zip(texts, vectors), metadatas=[d.metadata for d in batch_docs],
+                                           ids=list(batch_chunk_ids))
+                chunks_added += len(texts)
+            if existing or texts:
+                save_user_vectorstore(user_id, vectorstore)
+            # Re-read the checkpoint: clear_user_rag deletes it together with the index
+            done = load_checkpoint(checkpoint_path) | set(batch_ids)
+            save_checkpoint(checkpoint_path, done)
+        batch_docs.clear()
+        batch_chunk_ids.clear()
+        batch_ids.clear()
+
+    for entry, chunks in _chunk_all(pending, workers):
+        if chunks is None:
+            files_failed += 1
+            continue
+        for n, c in enumerate(chunks):
+            batch_chunk_ids.append(f"{entry['id']}:{n}")
+            batch_docs.append(Document(
+                page_content=c,
+                metadata={
+                    "filename": entry["name"],
+                    "folderpath": entry["folderPath"],
+                    "id": entry["id"] }
+                ))
+        batch_ids.append(entry["id"])
+        files_done += 1
+        if len(batch_docs) >= batch_size:
+            _flush()
+        elapsed = time.time() - start
+        print(f"[{files_done}/{len(pending)}] {entry['name']}: {len(chunks)} chunks "
+              f"({chunks_added + len(batch_docs)} total, {elapsed:.1f}s)")
+    _flush()
+
+    print(f"Done: {files_done} file(s), {chunks_added} chunk(s) in {time.time() - start:.1f}s")
+    if files_failed:
+        print(f"Failed: {files_failed} file(s) could not be read and will be retried on the next run",
+              file=sys.stderr)
+    return chunks_added
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Bulk ingest files into a user's FAISS index.")
+    parser.add_argument("--user-id", required=True, help="User id whose index receives the documents")
+    parser.add_argument("path", nargs="?", help="Directory to ingest recursively")
+    parser.add_argument("--manifest", help="JSON manifest listing files to ingest")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes used for text extraction")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks embedded per batch")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: next to the user's index)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and re-ingest every file, replacing its chunks")
+    args = parser.parse_args(argv)
+
+    if bool(args.path) == bool(args.manifest):
+        parser.error("give either a directory path or --manifest")
+
+    if args.manifest:
+        entries = collect_manifest(args.manifest, args.user_id)
+    else:
+        entries = collect_directory(args.path, args.user_id)
+
+    checkpoint_path = args.checkpoint or ingest_checkpoint_path(args.user_id)
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    print(f"Found {len(entries)} file(s) for user {args.user_id}")
+    ingest(args.user_id, entries, workers=args.workers, batch_size=args.batch_size, checkpoint_path=checkpoint_path)
+
+if __name__ == "__main__":
+    main()
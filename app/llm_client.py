@@ -0,0 +1,297 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional
+import httpx
+from dotenv import load_dotenv
+from openai import (
+    OpenAI,
+    RateLimitError,
+    APIConnectionError,
+    APIStatusError,
+    InternalServerError,
+)
+
+load_dotenv()
+
+# -------------------------
+# Constants
+# -------------------------
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+DEFAULT_MODEL = "deepseek/deepseek-chat-v3.1:free"
+
+# Ordered fallback list, e.g. "deepseek/deepseek-chat-v3.1:free,meta-llama/llama-3.3-70b-instruct:free"
+OPENROUTER_MODELS = [m.strip() for m in os.getenv("OPENROUTER_MODELS", DEFAULT_MODEL).split(",") if m.strip()]
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))             # retries per model after the first attempt
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))       # seconds
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))           # seconds
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))           # seconds, 0 disables hedging
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))  # seconds
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # seconds
+
+# Only these say something about a model's health and count towards its circuit breaker
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError, httpx.TimeoutException)
+# Caused by the account, not the model: every fallback model would fail the same way
+ACCOUNT_ERROR_STATUSES = {401, 402, 403}
+
+
+# -------------------------
+# Circuit breaker per model
+# -------------------------
+class CircuitBreaker:
+    """Opens after `failures` consecutive errors and lets one trial call through after `cooldown` seconds."""
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._trial_running or self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def record_ignored(self):
+        # The call ended in an error that says nothing about the model's health
+        # (bad request, account problem, ...): only free up a half-open trial
+        with self._lock:
+            self._trial_running = False
+
+
+# -------------------------
+# Stats per model
+# -------------------------
+class ModelStats:
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._latencies: deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.hedges = 0
+        self.last_error = ""
+
+    def record(self, latency: float, error: Optional[BaseException] = None):
+        with self._lock:
+            self.calls += 1
+            if error is None:
+                self._latencies.append(latency)
+            else:
+                self.errors += 1
+                self.last_error = type(error).__name__
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_hedge(self):
+        with self._lock:
+            self.hedges += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+            def pct(p: float) -> float:
+                return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "retries": self.retries,
+                "hedges": self.hedges,
+                "error_rate": self.errors / self.calls if self.calls else 0.0,
+                "latency_p50": pct(0.50),
+                "latency_p95": pct(0.95),
+                "latency_max": latencies[-1] if latencies else 0.0,
+                "last_error": self.last_error,
+            }
+
+
+# -------------------------
+# Helpers
+# -------------------------
+def _retry_after(error: BaseException) -> Optional[float]:
+    if not isinstance(error, APIStatusError):
+        return None
+    headers = error.response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None  # HTTP-date form, fall back to our own backoff
+    return None
+
+def _backoff(attempt: int, error: BaseException) -> Optional[float]:
+    # None when the server asks us to wait longer than we are willing to: retrying
+    # early would only hit the same limit again, so move on to the next model
+    server_delay = _retry_after(error)
+    if server_delay is not None:
+        return server_delay if server_delay <= LLM_BACKOFF_MAX else None
+    # Full jitter exponential backoff
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+# -------------------------
+# Resilient client
+# -------------------------
+class ResilientLLMClient:
+    """Chat completions with retries, optional hedging and ordered model fallback.
+
+    Each model is retried with jittered exponential backoff (honoring Retry-After)
+    on transient errors. Other request errors, an open circuit, exhausted retries
+    or a Retry-After beyond LLM_BACKOFF_MAX move on to the next model. Account
+    errors (401/402/403) are raised right away. If every model fails the last
+    error is raised.
+    """
+
+    def __init__(self, models: List[str] = OPENROUTER_MODELS, hedge_after: float = LLM_HEDGE_AFTER,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.models = models
+        self.hedge_after = hedge_after
+        self.max_retries = max_retries
+        self._client: Optional[OpenAI] = None
+        self._client_lock = threading.Lock()
+        self._breakers = {m: CircuitBreaker() for m in models}
+        self._stats = {m: ModelStats() for m in models}
+
+    @property
+    def client(self) -> OpenAI:
+        # Created on first use, so importing the app does not require OPENROUTER_API_KEY
+        with self._client_lock:
+            if self._client is None:
+                self._client = OpenAI(
+                    base_url=OPENROUTER_BASE_URL,
+                    api_key=OPENROUTER_API_KEY,
+                    timeout=LLM_REQUEST_TIMEOUT,
+                    max_retries=0,  # retries are handled here
+                )
+            return self._client
+
+    def _timed_call(self, model: str, **kwargs):
+        start = time.monotonic()
+        try:
+            resp = self.client.chat.completions.create(model=model, **kwargs)
+        except Exception as e:
+            self._stats[model].record(time.monotonic() - start, e)
+            raise
+        self._stats[model].record(time.monotonic() - start)
+        return resp
+
+    def _start_call(self, model: str, **kwargs) -> Future:
+        # One thread per request instead of a fixed pool: a pool queue would count
+        # towards hedge_after and fire hedges that queue behind the primaries too
+        future: Future = Future()
+
+        def run():
+            try:
+                future.set_result(self._timed_call(model, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="llm-hedge", daemon=True).start()
+        return future
+
+    def _call_hedged(self, model: str, **kwargs):
+        if self.hedge_after <= 0:
+            return self._timed_call(model, **kwargs)
+
+        # Fire a second identical request if the first is slow, take whichever finishes first
+        pending = {self._start_call(model, **kwargs)}
+        done, pending = wait(pending, timeout=self.hedge_after)
+        if not done:
+            self._stats[model].record_hedge()
+            pending.add(self._start_call(model, **kwargs))
+
+        error: Optional[BaseException] = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+            if not pending:
+                raise error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def create(self, **kwargs):
+        last_error: Optional[BaseException] = None
+        for model in self.models:
+            breaker = self._breakers[model]
+            for attempt in range(self.max_retries + 1):
+                if not breaker.allow():
+                    break
+                try:
+                    resp = self._call_hedged(model, **kwargs)
+                except RETRYABLE_ERRORS as e:
+                    breaker.record_failure()
+                    last_error = e
+                    delay = _backoff(attempt, e)
+                    if attempt < self.max_retries and delay is not None:
+                        self._stats[model].record_retry()
+                        time.sleep(delay)
+                        continue
+                    break
+                except APIStatusError as e:
+                    breaker.record_ignored()
+                    if e.status_code in ACCOUNT_ERROR_STATUSES:
+                        raise
+                    # Request rejected by this model (context too long, unsupported tools, ...): try the next one
+                    last_error = e
+                    break
+                except Exception:
+                    breaker.record_ignored()
+                    raise
+                breaker.record_success()
+                return resp
+        if last_error is None:
+            raise APIConnectionError(
+                message="All models are temporarily unavailable.",
+                request=httpx.Request("POST", OPENROUTER_BASE_URL + "/chat/completions"),
+            )
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            model: {**self._stats[model].to_dict(), "circuit": self._breakers[model].state}
+            for model in self.models
+        }
+
+
+llm_client = ResilientLLMClient()
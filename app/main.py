@@ -2,13 +2,21 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response
 from .routes import router
+from .scheduler import llm_scheduler
+from contextlib import asynccontextmanager
 import uuid
 import os 
 from dotenv import load_dotenv
 
 load_dotenv
 
-app = FastAPI(title="My AI Agent Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail fast if the LLM concurrency cap would starve the threadpool
+    llm_scheduler.check_threadpool()
+    yield
+
+app = FastAPI(title="My AI Agent Backend", lifespan=lifespan)
 FRONTEND_URL = os.getenv("FRONTEND_URL")
 
 # -------------------------
@@ -6,6 +6,8 @@ import numpy as np
 import sqlite3
 import tempfile
 import io
+import uuid
+from typing import List, Dict, Any
 from langchain_core.documents import Document
 
 # -------------------
@@ -55,6 +57,34 @@ def chunk_file(file, filename, chunk_size=500, overlap=50):
 
     return chunks
 
+# -------------------
+# Collecting files from disk
+# -------------------
+SUPPORTED_EXTENSIONS = {"pdf", "docx", "txt", "xlsx", "xls", "csv", "sqlite", "db"}
+
+def file_id_for(user_id: str, folder_path: str, name: str) -> str:
+    # Stable id so a resumed run produces the same metadata as the first one
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}/{folder_path}/{name}"))
+
+def collect_directory(root: str, user_id: str) -> List[Dict[str, Any]]:
+    root = os.path.abspath(root)
+    root_name = os.path.basename(root.rstrip(os.sep))
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        rel_dir = os.path.relpath(dirpath, root)
+        folder_path = root_name if rel_dir == "." else "/".join([root_name] + rel_dir.split(os.sep))
+        for name in sorted(filenames):
+            if name.split(".")[-1].lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            entries.append({
+                "path": os.path.join(dirpath, name),
+                "name": name,
+                "folderPath": folder_path,
+                "id": file_id_for(user_id, folder_path, name),
+            })
+    return entries
+
 # -------------------
 # Helper functions 
 # -------------------
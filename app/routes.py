@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Request, Cookie, UploadFile, File, HTTPException, Form, Depends
+from fastapi.concurrency import run_in_threadpool
 from typing import List
 from uuid import uuid4
 import sqlite3, json
@@ -9,10 +10,14 @@ from .services import (
     add_files,
     get_user_file_metadata,
     clear_user_rag,
-    call_llm
+    call_llm,
+    expand_tool_outputs,
+    delete_chat_tool_outputs
 )
 from langchain_core.documents import Document
 from .rag import chunk_file
+from .scheduler import llm_scheduler, SchedulerBusy
+from .llm_client import llm_client
 from .services import DB_PATH, SYSTEM_MESSAGE
 from typing import Literal, Optional
 from pydantic import BaseModel
@@ -27,8 +32,8 @@ class ChatMessage(BaseModel):
     content: str
     tool_call_id: Optional[str] = None
 
-# Dependency
-def get_user_id(user_id: str = Cookie(None)):
+# Dependency (async so it does not take a threadpool thread)
+async def get_user_id(user_id: str = Cookie(None)):
     if not user_id:
         raise HTTPException(status_code=400, detail="Missing user_id cookie")
     return user_id
@@ -38,13 +43,23 @@ def get_user_id(user_id: str = Cookie(None)):
 async def health():
     return {"status": "ok"}
 
+# LLM queue metrics
+@router.get("/metrics")
+async def metrics():
+    return {"llm_scheduler": llm_scheduler.metrics(), "llm_models": llm_client.stats()}
+
 # -------------------------
 # Chat endpoints
 # -------------------------
 @router.post("/chat/message/{chat_id}")
-def send_message(message: ChatMessage, chat_id: str, user_id: str = Depends(get_user_id)):
+async def send_message(message: ChatMessage, chat_id: str, user_id: str = Depends(get_user_id)):
     user_message = message.content
-    messages = call_llm(user_message, chat_id, user_id)
+    try:
+        # Wait for a slot on the event loop, only then hand the turn to the threadpool
+        async with llm_scheduler.slot(user_id):
+            messages = await run_in_threadpool(call_llm, user_message, chat_id, user_id)
+    except SchedulerBusy as e:
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
     return messages
 
 @router.post("/chat/new")
@@ -55,7 +70,7 @@ def new_chat(user_id: str = Depends(get_user_id)):
 
 @router.get("/chat/load/{chat_id}")
 def load_chat(chat_id: str, user_id: str = Depends(get_user_id)):
-    messages = get_messages(chat_id)
+    messages = expand_tool_outputs(get_messages(chat_id))
     visible_messages = [m for m in messages if m["role"] in ("user", "assistant", "tool")]
     return {"chat_id": chat_id, "messages": visible_messages}
 
@@ -68,8 +83,11 @@ def delete_chat(chat_id: str, user_id: str = Depends(get_user_id)):
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     cur.execute("DELETE FROM chats WHERE chat_id=? AND user_id=?", (chat_id, user_id))
+    deleted = cur.rowcount
     conn.commit()
     conn.close()
+    if deleted:
+        delete_chat_tool_outputs(chat_id)
     return {"status": "ok"}
 
 @router.post("/chat/rename/{chat_id}")
@@ -100,7 +118,8 @@ async def upload_files(request: Request, files: List[UploadFile] = File(...), us
                     "folderpath": meta["folderPath"], 
                     "id": meta["id"] } 
                 )) 
-    add_files(user_id, docs)
+    # add_files blocks on the user's index lock, keep it off the event loop
+    await run_in_threadpool(add_files, user_id, docs)
     return {"status": "ok", "added": len(docs)}
 
 @router.get("/files/metadata")
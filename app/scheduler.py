@@ -0,0 +1,209 @@
+import os
+import time
+import asyncio
+from collections import deque, OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+import anyio.to_thread
+
+# -------------------------
+# Constants
+# -------------------------
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "4"))
+LLM_MAX_PER_USER = int(os.getenv("LLM_MAX_PER_USER", "1"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_MAX_QUEUE_PER_USER = int(os.getenv("LLM_MAX_QUEUE_PER_USER", "4"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+
+
+class SchedulerBusy(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("user_id", "granted", "enqueued_at")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.granted = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+# -------------------------
+# Fair scheduler for LLM turns
+# -------------------------
+class LLMScheduler:
+    """Admission control in front of call_llm.
+
+    At most max_concurrent turns run at once and at most max_per_user per user.
+    Waiting turns are queued per user and handed out round-robin across users,
+    so one busy user cannot starve the others. When the queue is full the turn
+    is rejected straight away with SchedulerBusy.
+
+    Waiting happens on the event loop, so queued turns do not hold a threadpool
+    thread; only admitted turns run call_llm in the threadpool. All state is
+    only touched from the event loop, which is why there is no lock.
+    """
+
+    def __init__(self, max_concurrent: int = LLM_MAX_CONCURRENT, max_per_user: int = LLM_MAX_PER_USER,
+                 max_queue: int = LLM_MAX_QUEUE, max_queue_per_user: int = LLM_MAX_QUEUE_PER_USER,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout = queue_timeout
+
+        self._running = 0
+        self._running_per_user: Dict[str, int] = {}
+        self._queues: "OrderedDict[str, deque[_Ticket]]" = OrderedDict()  # users in round-robin order
+        self._queued = 0
+
+        # Metrics
+        self._admitted = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._turn_total = 0.0
+        self._turns_finished = 0
+
+    # Helpers
+    def _retry_after(self) -> int:
+        avg_turn = self._turn_total / self._turns_finished if self._turns_finished else 10.0
+        waves = (self._queued // max(self.max_concurrent, 1)) + 1
+        return max(1, int(avg_turn * waves))
+
+    def _can_run(self, user_id: str) -> bool:
+        return (self._running < self.max_concurrent
+                and self._running_per_user.get(user_id, 0) < self.max_per_user)
+
+    def _start(self, user_id: str):
+        self._running += 1
+        self._running_per_user[user_id] = self._running_per_user.get(user_id, 0) + 1
+
+    def _dispatch(self):
+        # Hand free slots to queued users in round-robin order
+        while self._running < self.max_concurrent and self._queued:
+            for user_id in list(self._queues):
+                if self._running_per_user.get(user_id, 0) >= self.max_per_user:
+                    continue
+                queue = self._queues.pop(user_id)
+                ticket = queue.popleft()
+                self._queued -= 1
+                if queue:
+                    self._queues[user_id] = queue  # back of the rotation
+                ticket.granted.set_result(True)
+                self._start(user_id)
+                break
+            else:
+                break  # every waiting user is at its own cap
+
+    def _remove(self, ticket: _Ticket):
+        queue = self._queues.get(ticket.user_id)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            self._queued -= 1
+            if not queue:
+                del self._queues[ticket.user_id]
+
+    def _free(self, user_id: str):
+        self._running -= 1
+        remaining = self._running_per_user.get(user_id, 1) - 1
+        if remaining:
+            self._running_per_user[user_id] = remaining
+        else:
+            self._running_per_user.pop(user_id, None)
+        self._dispatch()
+
+    def _record_wait(self, waited: float):
+        self._admitted += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    # Public API
+    def check_threadpool(self):
+        # Admitted turns each hold a threadpool thread while call_llm runs, keep
+        # enough threads free for the other sync endpoints and dependencies
+        total = anyio.to_thread.current_default_thread_limiter().total_tokens
+        if self.max_concurrent > total // 2:
+            raise RuntimeError(
+                f"LLM_MAX_CONCURRENT={self.max_concurrent} leaves too few of the {total} threadpool "
+                f"threads for other requests, use at most {total // 2}"
+            )
+
+    async def acquire(self, user_id: str):
+        if not self._queued and self._can_run(user_id):
+            self._start(user_id)
+            self._record_wait(0.0)
+            return
+
+        user_queue = self._queues.get(user_id)
+        if self._queued >= self.max_queue:
+            self._rejected += 1
+            raise SchedulerBusy("Server is busy. Please try again shortly.", self._retry_after())
+        if user_queue and len(user_queue) >= self.max_queue_per_user:
+            self._rejected += 1
+            raise SchedulerBusy("Too many messages in progress. Please wait for the current replies.",
+                                self._retry_after())
+
+        ticket = _Ticket(user_id)
+        self._queues.setdefault(user_id, deque()).append(ticket)
+        self._queued += 1
+        self._dispatch()
+
+        try:
+            await asyncio.wait({ticket.granted}, timeout=self.queue_timeout)
+        except BaseException:
+            # Request cancelled (client disconnected): give back a slot granted meanwhile
+            if ticket.granted.done():
+                self._free(user_id)
+            else:
+                self._remove(ticket)
+            raise
+
+        if not ticket.granted.done():
+            self._remove(ticket)
+            self._timed_out += 1
+            raise SchedulerBusy("Server is busy. Please try again shortly.", self._retry_after())
+        self._record_wait(time.monotonic() - ticket.enqueued_at)
+
+    def release(self, user_id: str, duration: float = 0.0):
+        self._turn_total += duration
+        self._turns_finished += 1
+        self._free(user_id)
+
+    @asynccontextmanager
+    async def slot(self, user_id: str):
+        await self.acquire(user_id)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(user_id, time.monotonic() - start)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "queue_depth": self._queued,
+            "queued_users": len(self._queues),
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "timed_out": self._timed_out,
+            "avg_queue_wait_seconds": self._wait_total / self._admitted if self._admitted else 0.0,
+            "max_queue_wait_seconds": self._wait_max,
+            "avg_turn_seconds": self._turn_total / self._turns_finished if self._turns_finished else 0.0,
+            "limits": {
+                "max_concurrent": self.max_concurrent,
+                "max_per_user": self.max_per_user,
+                "max_queue": self.max_queue,
+                "max_queue_per_user": self.max_queue_per_user,
+                "queue_timeout": self.queue_timeout,
+            },
+        }
+
+
+llm_scheduler = LLMScheduler()
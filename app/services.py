@@ -4,14 +4,14 @@ import json
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 from typing import List
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_community.docstore.in_memory import InMemoryDocstore
 import faiss
 from .tools import TOOLS, get_tool_responses
 from langchain_core.documents import Document
+from .llm_client import llm_client
+from .embeddings import get_embeddings, DIMENSION
 from openai import (
-    OpenAI,
     RateLimitError,
     APIConnectionError,
     APIError,
@@ -21,6 +21,9 @@ from collections import defaultdict
 from typing import Dict, Any
 import uuid
 import httpx
+import hashlib
+import zstandard
+from filelock import FileLock
 
 load_dotenv()
 
@@ -39,14 +42,29 @@ conn.execute(
         timestamp TEXT
     )"""
 )
+conn.execute(
+    """CREATE TABLE IF NOT EXISTS tool_outputs (
+        hash TEXT PRIMARY KEY,
+        data BLOB NOT NULL,
+        size INTEGER,
+        timestamp TEXT
+    )"""
+)
+conn.execute(
+    """CREATE TABLE IF NOT EXISTS tool_output_refs (
+        chat_id TEXT NOT NULL,
+        hash TEXT NOT NULL,
+        PRIMARY KEY (chat_id, hash)
+    )"""
+)
+conn.execute("CREATE INDEX IF NOT EXISTS idx_tool_output_refs_hash ON tool_output_refs (hash)")
 conn.commit()
 conn.close()
 
-OPENROUTER_MODEL = "deepseek/deepseek-chat-v3.1:free"
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-
-EMBED_MODEL = "all-MiniLM-L6-v2"
-DIMENSION = 384
+# Tool outputs above this many characters are stored compressed in tool_outputs,
+# chat history only keeps a preview plus a reference ("content_ref")
+TOOL_OUTPUT_THRESHOLD = 4000
+TOOL_OUTPUT_PREVIEW = 1000
 
 with open("system.txt") as f:
     SYSTEM_MESSAGE = f.read()
@@ -85,18 +103,95 @@ def save_messages(user_id: str, chat_id: str, messages: List[dict]):
     conn = get_db_connection()
     cur = conn.cursor()
     timestamp = datetime.now(timezone.utc).isoformat()
+    stored = [_store_tool_output(cur, chat_id, m, timestamp) for m in messages]
     cur.execute(
         "INSERT OR REPLACE INTO chats (chat_id, user_id, messages, timestamp) VALUES (?, ?, ?, ?)",
-        (chat_id, user_id, json.dumps(messages), timestamp)
+        (chat_id, user_id, json.dumps(stored), timestamp)
+    )
+    conn.commit()
+    conn.close()
+
+# -------------------------
+# Large tool outputs
+# -------------------------
+def _store_tool_output(cur, chat_id: str, message: dict, timestamp: str) -> dict:
+    content = message.get("content")
+    if message.get("role") != "tool" or not isinstance(content, str) or len(content) <= TOOL_OUTPUT_THRESHOLD:
+        return message
+
+    # Content-addressed, so identical outputs and repeated saves are stored once
+    data = content.encode("utf-8")
+    ref = hashlib.sha256(data).hexdigest()
+    # Track which chats use an output, so deleting the last one can remove it. The ref
+    # is written first: that opens the write transaction, so a concurrent
+    # delete_chat_tool_outputs cannot remove the blob between the check below and commit
+    cur.execute("INSERT OR IGNORE INTO tool_output_refs (chat_id, hash) VALUES (?, ?)", (chat_id, ref))
+    cur.execute("SELECT 1 FROM tool_outputs WHERE hash=?", (ref,))
+    if not cur.fetchone():
+        cur.execute(
+            "INSERT OR IGNORE INTO tool_outputs (hash, data, size, timestamp) VALUES (?, ?, ?, ?)",
+            (ref, zstandard.ZstdCompressor().compress(data), len(data), timestamp)
+        )
+    preview = content[:TOOL_OUTPUT_PREVIEW] + f"\n\n[... truncated {len(content) - TOOL_OUTPUT_PREVIEW} characters]"
+    return {**message, "content": preview, "content_ref": ref}
+
+def expand_tool_outputs(messages: List[dict]) -> List[dict]:
+    refs = {m["content_ref"] for m in messages if m.get("content_ref")}
+    if not refs:
+        return messages
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT hash, data FROM tool_outputs WHERE hash IN ({','.join('?' * len(refs))})",
+        tuple(refs)
     )
+    decompressor = zstandard.ZstdDecompressor()
+    outputs = {row["hash"]: decompressor.decompress(row["data"]).decode("utf-8") for row in cur.fetchall()}
+    conn.close()
+
+    expanded = []
+    for m in messages:
+        ref = m.get("content_ref")
+        if ref:
+            m = {k: v for k, v in m.items() if k != "content_ref"}
+            m["content"] = outputs.get(ref, m["content"])
+        expanded.append(m)
+    return expanded
+
+def delete_chat_tool_outputs(chat_id: str):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT hash FROM tool_output_refs WHERE chat_id=?", (chat_id,))
+    refs = [row["hash"] for row in cur.fetchall()]
+    cur.execute("DELETE FROM tool_output_refs WHERE chat_id=?", (chat_id,))
+    for ref in refs:
+        # Outputs are shared between chats, only remove ones no other chat refers to
+        cur.execute(
+            "DELETE FROM tool_outputs WHERE hash=? AND NOT EXISTS (SELECT 1 FROM tool_output_refs WHERE hash=?)",
+            (ref, ref)
+        )
     conn.commit()
     conn.close()
 
+def _llm_message(message: dict) -> dict:
+    # content_ref is only for our own storage, the LLM gets the preview
+    if "content_ref" not in message:
+        return message
+    return {k: v for k, v in message.items() if k != "content_ref"}
+
 # -------------------------
 # FAISS handling per user
 # -------------------------
 def get_user_vectorstore(user_id: str) -> FAISS:
-    embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
+    # save_local writes index.faiss and index.pkl in place, so reads take the same
+    # lock as writers to never see a new index with an old or half-written docstore
+    with user_index_lock(user_id):
+        return load_user_vectorstore(user_id)
+
+def load_user_vectorstore(user_id: str) -> FAISS:
+    # Caller must hold user_index_lock(user_id)
+    embeddings = get_embeddings()
 
     index_folder = os.path.join(INDEX_DIR, f"faiss_user_{user_id}.index")
     os.makedirs(INDEX_DIR, exist_ok=True)
@@ -116,27 +211,42 @@ def get_user_vectorstore(user_id: str) -> FAISS:
         )
 
 def save_user_vectorstore(user_id: str, vectorstore: FAISS):
+    # Caller must hold user_index_lock(user_id)
     os.makedirs(INDEX_DIR, exist_ok=True) 
     index_folder = os.path.join(INDEX_DIR, f"faiss_user_{user_id}.index")
     vectorstore.save_local(index_folder)
 
+def user_index_lock(user_id: str) -> FileLock:
+    # Serializes load/add/save of a user's index across API workers and the ingest CLI
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    return FileLock(os.path.join(INDEX_DIR, f"faiss_user_{user_id}.lock"))
+
+def ingest_checkpoint_path(user_id: str) -> str:
+    return os.path.join(INDEX_DIR, f"ingest_user_{user_id}.checkpoint.json")
+
 # -------------------------
 # File handling
 # -------------------------
 def add_files(user_id: str, documents: List[Document]):
-    vectorstore = get_user_vectorstore(user_id)
-    vectorstore.add_documents(documents)
-    save_user_vectorstore(user_id, vectorstore)
+    with user_index_lock(user_id):
+        vectorstore = load_user_vectorstore(user_id)
+        vectorstore.add_documents(documents)
+        save_user_vectorstore(user_id, vectorstore)
 
 def clear_user_rag(user_id: str):
-    embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
+    embeddings = get_embeddings()
     vectorstore = FAISS(
         embedding_function=embeddings,
         index=faiss.IndexFlatIP(DIMENSION),
         docstore=InMemoryDocstore(),
         index_to_docstore_id={},
     )
-    save_user_vectorstore(user_id, vectorstore)
+    with user_index_lock(user_id):
+        save_user_vectorstore(user_id, vectorstore)
+        # A stale ingest checkpoint would make a re-run skip everything that was just cleared
+        checkpoint_path = ingest_checkpoint_path(user_id)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
     return vectorstore
 
 def get_uploaded_files_summary(user_id: str) -> str:
@@ -217,11 +327,6 @@ def get_user_file_metadata(user_id: str) -> Dict[str, Any]:
 # LLM interaction
 # -------------------------
 def call_llm(user_message: str, chat_id: str, user_id: str) -> list[dict]:
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=OPENROUTER_API_KEY,
-    )
-
     messages = get_messages(chat_id)
 
     # Update system message with file metadata and current date for tool call context
@@ -248,10 +353,9 @@ def call_llm(user_message: str, chat_id: str, user_id: str) -> list[dict]:
         while iteration_count < max_iterations:
             iteration_count += 1
 
-            resp = client.chat.completions.create(
-                model=OPENROUTER_MODEL,
+            resp = llm_client.create(
                 tools=TOOLS,
-                messages=messages,
+                messages=[_llm_message(m) for m in messages],
             )
 
             msg = resp.choices[0].message
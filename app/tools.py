@@ -1,6 +1,7 @@
 import json
 import sympy as sp
 import re
+import numpy as np
 import requests
 from bs4 import BeautifulSoup
 from langchain_community.tools import DuckDuckGoSearchResults
@@ -8,23 +9,49 @@ from langchain_community.tools import DuckDuckGoSearchResults
 # -------------------
 # Tool functions
 # -------------------
-def rag_tool(query: str, user_id: str, min_score: float = 0.3, k_amount: int = 5) -> str: 
+def rag_tool(query: str | None = None, *, user_id: str, min_score: float = 0.3, k_amount: int = 5,
+             queries: list[str] | str | None = None) -> str:
     from .services import get_user_vectorstore
+    # Models sometimes send `queries` as a single string, and may mix in non-strings
+    if isinstance(queries, str):
+        queries = [queries]
+    candidates = [query] + (queries if isinstance(queries, list) else [])
+    queries = list(dict.fromkeys(q.strip() for q in candidates if isinstance(q, str) and q.strip()))
+    print(f"tool called with {queries}, {min_score}, {k_amount}")
+    if not queries:
+        return "No query given."
     vector_store = get_user_vectorstore(user_id)
-    docs = vector_store.similarity_search_with_score(query, k=k_amount) # Add metadata filtering?
-    print(f"tool called with {query}, {min_score}, {k_amount}")
-    if len(docs) == 0:
+    if vector_store.index.ntotal == 0:
         return "No docs uploaded."
-    docs = [(d, score) for d, score in docs if score > min_score]
-    sources = "\n\n".join(
-        [
-            f"File: {d.metadata.get('filename', '')}\n"
-            f"Path: {d.metadata.get('folderpath', '')}\n"
-            f"Content: {d.page_content}"
-            for d, score in docs
-        ]
+
+    # One embedding batch and one FAISS search for all queries
+    vectors = np.array(vector_store.embeddings.embed_queries(queries), dtype=np.float32)
+    scores, ids = vector_store.index.search(vectors, min(k_amount, vector_store.index.ntotal))
+
+    seen = set()
+    groups = []
+    for q, q_scores, q_ids in zip(queries, scores, ids):
+        docs = []
+        for score, i in zip(q_scores, q_ids):
+            if i == -1 or score <= min_score or i in seen:
+                continue  # chunks already returned for an earlier query are not repeated
+            seen.add(i)
+            docs.append(vector_store.docstore.search(vector_store.index_to_docstore_id[i]))
+        sources = "\n\n".join(
+            [
+                f"File: {d.metadata.get('filename', '')}\n"
+                f"Path: {d.metadata.get('folderpath', '')}\n"
+                f"Content: {d.page_content}"
+                for d in docs
+            ]
+        )
+        groups.append((q, sources))
+
+    if len(groups) == 1:
+        return groups[0][1] or "No relevant results found."
+    return "\n\n".join(
+        f"Query: {q}\n\n{sources or 'No new relevant results found.'}" for q, sources in groups
     )
-    return sources or "No relevant results found."
 
 def search_tool(query: str) -> str:
     # Detect if input looks like a URL
@@ -67,7 +94,7 @@ rag_tool_schema = {
     "type": "function",
     "function": {
         "name": "search_uploaded_files",
-        "description": "Search the user's uploaded documents for relevant information. Allows optional tuning with min_score and k_amount.",
+        "description": "Search the user's uploaded documents for relevant information. Pass several queries at once in 'queries' to gather all needed context in one call; results are grouped per query without duplicates. Allows optional tuning with min_score and k_amount.",
         "parameters": {
             "type": "object",
             "properties": {
@@ -75,6 +102,11 @@ rag_tool_schema = {
                     "type": "string",
                     "description": "The search query to run against uploaded documents."
                 },
+                "queries": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Optional. Multiple search queries to run in one call, e.g. for different aspects of the question."
+                },
                 "min_score": {
                     "type": "number",
                     "description": "Optional. Minimum similarity score threshold for results (default = 0.3).",
@@ -82,11 +114,11 @@ rag_tool_schema = {
                 },
                 "k_amount": {
                     "type": "integer",
-                    "description": "Optional. Number of top results to return (default = 5).",
+                    "description": "Optional. Number of top results to return per query (default = 5).",
                     "default": 5
                 }
             },
-            "required": ["query"]
+            "required": []
         }
     }
 }